@@ -5,21 +5,36 @@ WebSocket server integrating VisionEngine and Riot LCU API.
 
 import asyncio
 import json
-import threading
+import traceback
 from datetime import datetime
-from typing import Optional, Set
+from typing import Dict, Optional, Set
 
 import requests
 import urllib3
 import websockets
-from websockets.server import WebSocketServerProtocol
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.protocol import State
 
 from vision import VisionEngine, Detection
 
+# Optional: orjson is several times faster than json for small packets
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Disable SSL warnings for Riot's self-signed certificate
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
+def dumps(message: dict) -> bytes:
+    """Serialize a packet to UTF-8 JSON, using orjson when installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(message)
+    return json.dumps(message).encode()
+
+
 class RiotLCUClient:
     """Client for Riot's Live Client Data API (read-only)."""
     
@@ -50,16 +65,38 @@ class RiotLCUClient:
 class JungleGapServer:
     """Main WebSocket server orchestrating Vision Engine and LCU API."""
     
+    # Seconds between heartbeats while no detections are firing
+    HEARTBEAT_INTERVAL = 1.0
+    # Max pending messages on the shared topic before heartbeats are dropped
+    TOPIC_SIZE = 256
+    # Max pending messages per client before heartbeats start being dropped
+    CLIENT_QUEUE_SIZE = 64
+    # Write coalescing: packets sent within this window share one frame
+    FLUSH_INTERVAL = 0.05
+    MAX_BATCH_MESSAGES = 128
+    MAX_BATCH_BYTES = 32 * 1024
+    # Clients enqueued per broadcast before yielding to the event loop
+    BROADCAST_CHUNK_SIZE = 50
+    
     def __init__(
         self, 
         host: str = "localhost", 
         port: int = 8765,
         model_path: Optional[str] = None,
-        use_mock: bool = True
+        use_mock: bool = True,
+        lcu_poll_interval: float = 1.0
     ):
         self.host = host
         self.port = port
-        self.connected_clients: Set[WebSocketServerProtocol] = set()
+        self.connected_clients: Set[ServerConnection] = set()
+        
+        # Per-client outgoing queues drained by dedicated writer tasks
+        self._client_queues: Dict[ServerConnection, asyncio.Queue] = {}
+        self._client_writers: Dict[ServerConnection, asyncio.Task] = {}
+        
+        # Single producer topic of (payload, is_alert), fanned out by _distributor.
+        # Created in start() so it binds to the running event loop (Python 3.9)
+        self._topic: Optional[asyncio.Queue] = None
         
         self.lcu_client = RiotLCUClient()
         self.vision_engine = VisionEngine(
@@ -67,29 +104,169 @@ class JungleGapServer:
             use_mock=use_mock
         )
         
-        # Shared state between threads
         self._running = False
-        self._latest_detection: Optional[Detection] = None
-        self._detection_lock = threading.Lock()
+        # Holds only the latest unconsumed detection from the vision task (see start())
+        self._detections: Optional[asyncio.Queue] = None
+        
+        # Game time is refreshed at most every `lcu_poll_interval` seconds
+        self.lcu_poll_interval = lcu_poll_interval
+        self._game_time: Optional[float] = None
+        
+        # Last encoded heartbeat and the game time it was built for
+        self._last_heartbeat_game_time: Optional[float] = None
+        self._last_heartbeat_payload: Optional[bytes] = None
 
-    async def register(self, websocket: WebSocketServerProtocol):
+    async def register(self, websocket: ServerConnection):
+        self._client_queues[websocket] = asyncio.Queue(maxsize=self.CLIENT_QUEUE_SIZE)
+        self._client_writers[websocket] = asyncio.create_task(self._writer(websocket))
         self.connected_clients.add(websocket)
         print(f"[WS] Client connected. Total: {len(self.connected_clients)}")
 
-    async def unregister(self, websocket: WebSocketServerProtocol):
+    async def unregister(self, websocket: ServerConnection):
+        if websocket not in self.connected_clients:
+            return  # Already cleaned up (writer, fanout or handler got here first)
         self.connected_clients.discard(websocket)
+        self._client_queues.pop(websocket, None)
+        writer = self._client_writers.pop(websocket, None)
+        if writer and writer is not asyncio.current_task():
+            writer.cancel()
         print(f"[WS] Client disconnected. Total: {len(self.connected_clients)}")
 
-    async def broadcast(self, message: dict):
+    async def _writer(self, websocket: ServerConnection):
+        """
+        Drain a client's outgoing queue so slow clients never block the others.
+        
+        Messages queued within FLUSH_INTERVAL of each other are coalesced
+        into a single frame holding a JSON array of packets.
+        """
+        queue = self._client_queues[websocket]
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = [await queue.get()]
+                size = len(batch[0])
+                deadline = loop.time() + self.FLUSH_INTERVAL
+                
+                while len(batch) < self.MAX_BATCH_MESSAGES and size < self.MAX_BATCH_BYTES:
+                    if queue.empty():
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            break
+                        try:
+                            payload = await asyncio.wait_for(queue.get(), timeout=remaining)
+                        except asyncio.TimeoutError:
+                            break
+                    else:
+                        payload = queue.get_nowait()
+                    batch.append(payload)
+                    size += len(payload)
+                
+                frame = b"[" + b",".join(batch) + b"]"
+                if not self._send_sync(websocket, frame):
+                    await websocket.send(frame, text=True)
+        except websockets.ConnectionClosed:
+            await self.unregister(websocket)
+
+    @staticmethod
+    def _send_sync(websocket: ServerConnection, frame: bytes) -> bool:
+        """
+        Frame UTF-8 JSON as a text message and write it directly to the
+        transport when it can take the data.
+        
+        Skips the send() coroutine on the common fast-drain path. Returns False
+        when the connection is not open or the write buffer is above its high
+        watermark, in which case the caller must await websocket.send().
+        """
+        transport = websocket.transport
+        if websocket.protocol.state is not State.OPEN or transport.is_closing():
+            return False
+        _, high_water = transport.get_write_buffer_limits()
+        if transport.get_write_buffer_size() >= high_water:
+            return False
+        
+        websocket.protocol.send_text(frame)
+        for data in websocket.protocol.data_to_send():
+            if data:
+                transport.write(data)
+        return True
+
+    def _heartbeat_payload(self, game_time: Optional[float]) -> bytes:
+        """
+        Return the encoded heartbeat, re-serializing only when game time changes.
+        
+        In game, game time advances between 1 Hz heartbeats so this rarely
+        hits; it saves the work while out of game (or with the game paused),
+        when every heartbeat is identical.
+        """
+        if self._last_heartbeat_payload is None or game_time != self._last_heartbeat_game_time:
+            self._last_heartbeat_payload = dumps({
+                "type": "heartbeat",
+                "game_time": game_time,
+                "in_game": game_time is not None
+            })
+            self._last_heartbeat_game_time = game_time
+        return self._last_heartbeat_payload
+
+    def broadcast(self, message: dict):
+        """Encode a message once and publish it to every client."""
         if not self.connected_clients:
             return
-        payload = json.dumps(message)
-        await asyncio.gather(
-            *[client.send(payload) for client in self.connected_clients],
-            return_exceptions=True
-        )
+        self.publish(dumps(message), is_alert=message.get("type") == "alert")
 
-    async def handler(self, websocket: WebSocketServerProtocol):
+    def publish(self, payload: bytes, is_alert: bool):
+        """
+        Put an encoded payload on the shared topic without waiting.
+        
+        Producers never block on clients: _distributor copies each payload
+        into the per-client queues, whose writer tasks drain independently.
+        """
+        if self._topic.full():
+            if not is_alert:
+                return
+            self._topic.get_nowait()
+        self._topic.put_nowait((payload, is_alert))
+
+    async def _distributor(self):
+        """Fan messages from the shared topic out to every subscribed client."""
+        while True:
+            payload, is_alert = await self._topic.get()
+            await self._fanout(payload, is_alert)
+
+    async def _fanout(self, payload: bytes, is_alert: bool):
+        """
+        Push an encoded payload onto every client's outgoing queue.
+        
+        Clients are enqueued in chunks of BROADCAST_CHUNK_SIZE, yielding to the
+        event loop between chunks so large fanouts never starve socket reads.
+        
+        Heartbeats are dropped under backpressure (only half the queue is
+        available to them); alerts evict the oldest pending message instead.
+        
+        Iterates over a snapshot of the client set; connections found closed
+        are collected and unregistered only after the fanout completes.
+        """
+        dead = []
+        for index, client in enumerate(list(self.connected_clients)):
+            if index and index % self.BROADCAST_CHUNK_SIZE == 0:
+                await asyncio.sleep(0)
+            queue = self._client_queues.get(client)
+            if queue is None:
+                continue
+            if client.state is State.CLOSED:
+                dead.append(client)
+                continue
+            if not is_alert:
+                if queue.qsize() < queue.maxsize // 2:
+                    queue.put_nowait(payload)
+                continue
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
+        
+        for client in dead:
+            await self.unregister(client)
+
+    async def handler(self, websocket: ServerConnection):
         await self.register(websocket)
         try:
             async for _ in websocket:
@@ -97,34 +274,63 @@ class JungleGapServer:
         finally:
             await self.unregister(websocket)
 
-    def _vision_thread(self):
+    async def _vision_task(self):
         """
-        Background thread running the Vision Engine.
-        Updates _latest_detection when enemy jungler is spotted.
+        Consume the Vision Engine's async detection stream.
+        Keeps only the most recent detection for main_loop to pick up.
         """
-        print("[Vision] Thread started")
+        print("[Vision] Task started")
         
-        for detection in self.vision_engine.run_loop(fps=10):
-            if not self._running:
-                break
-            
-            with self._detection_lock:
-                self._latest_detection = detection
+        try:
+            async for detection in self.vision_engine.run_loop(fps=10):
+                if not self._running:
+                    break
+                
+                if self._detections.full():
+                    self._detections.get_nowait()
+                self._detections.put_nowait(detection)
+        except Exception:
+            # Without detections the overlay is useless; fail loudly and shut down
+            print("[Vision] Detection loop crashed, stopping server:")
+            traceback.print_exc()
+            self.stop()
         
-        print("[Vision] Thread stopped")
+        print("[Vision] Task stopped")
+
+    @staticmethod
+    def _report_task_failure(task: asyncio.Task):
+        """Done callback: print any exception a background task died with."""
+        if task.cancelled() or task.exception() is None:
+            return
+        exc = task.exception()
+        print(f"[Server] Task {task.get_name()} failed:")
+        traceback.print_exception(type(exc), exc, exc.__traceback__)
 
     async def main_loop(self):
-        """Main async loop: check for detections and broadcast alerts."""
+        """
+        Main async loop: broadcast alerts as detections land.
+        
+        Wakes up on a new detection or when the next heartbeat is due, rather
+        than on a fixed tick, so an idle server only wakes once per second.
+        """
+        loop = asyncio.get_running_loop()
+        next_poll = next_heartbeat = loop.time()
+        
         while self._running:
-            # Get game time from Riot API
-            game_time = self.lcu_client.get_game_time()
+            # Refresh game time from Riot API off the event loop
+            if loop.time() >= next_poll:
+                self._game_time = await asyncio.to_thread(self.lcu_client.get_game_time)
+                next_poll = loop.time() + self.lcu_poll_interval
+            game_time = self._game_time
             
-            # Check for new detection from vision thread
-            detection = None
-            with self._detection_lock:
-                if self._latest_detection:
-                    detection = self._latest_detection
-                    self._latest_detection = None  # Consume detection
+            # Wait for the vision task's next detection, or the heartbeat deadline
+            try:
+                detection: Optional[Detection] = await asyncio.wait_for(
+                    self._detections.get(),
+                    timeout=max(0.0, next_heartbeat - loop.time())
+                )
+            except asyncio.TimeoutError:
+                detection = None
             
             if detection:
                 alert = {
@@ -136,23 +342,23 @@ class JungleGapServer:
                     "timestamp": datetime.now().isoformat()
                 }
                 print(f"[ALERT] {detection.champion} spotted at {detection.location} ({detection.confidence:.0%})")
-                await self.broadcast(alert)
+                self.broadcast(alert)
             else:
-                # Send heartbeat
-                await self.broadcast({
-                    "type": "heartbeat",
-                    "game_time": game_time,
-                    "in_game": game_time is not None
-                })
-            
-            await asyncio.sleep(0.1)  # 10 updates per second
+                next_heartbeat = loop.time() + self.HEARTBEAT_INTERVAL
+                if self.connected_clients:
+                    # Send heartbeat (cached between game time changes)
+                    self.publish(self._heartbeat_payload(game_time), is_alert=False)
 
     async def start(self):
         self._running = True
+        self._topic = asyncio.Queue(maxsize=self.TOPIC_SIZE)
+        self._detections = asyncio.Queue(maxsize=1)
         
-        # Start Vision Engine in background thread
-        vision_thread = threading.Thread(target=self._vision_thread, daemon=True)
-        vision_thread.start()
+        # Run the Vision Engine on the event loop (blocking work is offloaded to threads)
+        vision_task = asyncio.create_task(self._vision_task(), name="vision")
+        distributor_task = asyncio.create_task(self._distributor(), name="distributor")
+        for task in (vision_task, distributor_task):
+            task.add_done_callback(self._report_task_failure)
         
         print("=" * 50)
         print("  JungleGap.ai - Backend Engine")
@@ -162,8 +368,14 @@ class JungleGapServer:
         print("[INFO] Press Ctrl+C to stop")
         print("=" * 50)
         
-        async with websockets.serve(self.handler, self.host, self.port):
-            await self.main_loop()
+        # permessage-deflate is disabled: packets are tiny, and per-connection
+        # compression would redo identical work (and hold compressor state) per client
+        try:
+            async with serve(self.handler, self.host, self.port, compression=None):
+                await self.main_loop()
+        finally:
+            vision_task.cancel()
+            distributor_task.cancel()
 
     def stop(self):
         self._running = False
@@ -173,7 +385,7 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description="JungleGap.ai Backend")
-    parser.add_argument("--model", type=str, default=None, help="Path to YOLO model (.pt)")
+    parser.add_argument("--model", type=str, default=None, help="Path to YOLO model (.pt or .onnx)")
     parser.add_argument("--mock", action="store_true", help="Use mock detection for testing")
     parser.add_argument("--port", type=int, default=8765, help="WebSocket port")
     args = parser.parse_args()
@@ -0,0 +1,109 @@
+"""
+JungleGap.ai - Model Export
+Export a trained YOLOv8 model to ONNX, optionally quantized for faster inference.
+
+FP16 halves the model size and suits GPU inference; INT8 (static quantization
+calibrated on live minimap captures) targets CPU inference.
+"""
+
+import argparse
+import os
+import time
+from typing import List
+
+import mss
+import numpy as np
+
+from vision import VisionEngine, onnx_input_size
+
+
+def capture_calibration_frames(samples: int, interval: float) -> List[np.ndarray]:
+    """
+    Capture minimap frames for INT8 calibration.
+    Run this while a game is in progress so the frames are representative.
+    """
+    engine = VisionEngine(use_mock=True)
+    frames = []
+    
+    print(f"[Export] Capturing {samples} calibration frames...")
+    with mss.mss() as screen_capture:
+        for _ in range(samples):
+            frames.append(engine.capture_minimap(screen_capture=screen_capture).copy())
+            time.sleep(interval)
+    
+    return frames
+
+
+def quantize_int8(onnx_path: str, output_path: str, frames: List[np.ndarray]):
+    """Static INT8 quantization of an FP32 ONNX model."""
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+    import onnxruntime as ort
+    
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    model_input = session.get_inputs()[0]
+    size = onnx_input_size(session)
+    
+    class MinimapCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._frames = iter(frames)
+        
+        def get_next(self):
+            frame = next(self._frames, None)
+            if frame is None:
+                return None
+            return {model_input.name: VisionEngine._preprocess(frame, size)[None]}
+    
+    quantize_static(
+        onnx_path,
+        output_path,
+        MinimapCalibrationReader(),
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    copy_metadata(onnx_path, output_path)
+
+
+def copy_metadata(source_path: str, target_path: str):
+    """Carry Ultralytics metadata (imgsz, names, ...) over to the quantized model."""
+    import onnx
+    
+    source = onnx.load(source_path)
+    target = onnx.load(target_path)
+    existing = {prop.key for prop in target.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            target.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(target, target_path)
+
+
+def main():
+    from ultralytics import YOLO
+    
+    parser = argparse.ArgumentParser(description="JungleGap.ai Model Export")
+    parser.add_argument("model", type=str, help="Path to trained YOLO model (.pt)")
+    parser.add_argument("--precision", choices=["fp32", "fp16", "int8"], default="int8",
+                        help="fp16 for GPU inference (export needs a CUDA GPU), int8 for CPU inference")
+    parser.add_argument("--imgsz", type=int, default=320, help="Model input size (multiple of 32)")
+    parser.add_argument("--samples", type=int, default=100, help="INT8 calibration frames to capture")
+    args = parser.parse_args()
+    
+    # Dynamic batch axis so VisionEngine.detect_batch can run several frames per call
+    onnx_path = YOLO(args.model).export(
+        format="onnx",
+        imgsz=args.imgsz,
+        half=args.precision == "fp16",
+        dynamic=True,
+        # Ultralytics only exports FP16 ONNX on a GPU (it rejects half + dynamic on CPU)
+        device=0 if args.precision == "fp16" else None,
+    )
+    print(f"[Export] ONNX model written to {onnx_path}")
+    
+    if args.precision == "int8":
+        output_path = os.path.splitext(onnx_path)[0] + "_int8.onnx"
+        frames = capture_calibration_frames(args.samples, interval=0.1)
+        quantize_int8(onnx_path, output_path, frames)
+        print(f"[Export] INT8 model written to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
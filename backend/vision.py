@@ -3,9 +3,14 @@ JungleGap.ai - Vision Engine
 Screen capture and YOLOv8-based minimap analysis with dynamic resolution support.
 """
 
+import ast
+import asyncio
+import queue
+import random
+import threading
 import time
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 import ctypes
 
 import numpy as np
@@ -19,6 +24,38 @@ except ImportError:
     YOLO_AVAILABLE = False
     print("[Vision] Warning: ultralytics not installed. Using mock detection.")
 
+# Optional: xxhash for fast frame fingerprints (falls back to built-in hash)
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Optional: ONNX Runtime for exported (FP16 / INT8) models
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
+
+def onnx_input_size(session: "ort.InferenceSession") -> int:
+    """
+    Square input size of an exported YOLOv8 ONNX model.
+    
+    Dynamic exports name their spatial axes (e.g. 'height') instead of fixing
+    them, so fall back to the `imgsz` Ultralytics stores in model metadata.
+    """
+    height = session.get_inputs()[0].shape[2]
+    if isinstance(height, int):
+        return height
+    
+    imgsz = session.get_modelmeta().custom_metadata_map.get("imgsz")
+    if imgsz is None:
+        raise ValueError("ONNX model has a dynamic input size and no 'imgsz' metadata")
+    imgsz = ast.literal_eval(imgsz)
+    return int(imgsz[0] if isinstance(imgsz, (list, tuple)) else imgsz)
+
 
 def get_screen_resolution() -> Tuple[int, int]:
     """
@@ -81,6 +118,68 @@ class Detection:
     bbox: Tuple[int, int, int, int]
 
 
+class FramePool:
+    """
+    Preallocated frames cycled between a capture (producer) thread and an
+    inference (consumer) loop.
+    
+    The producer fills a free slot and publishes its index; the consumer
+    takes published slots in batches and releases them once inference is
+    done. When every slot is busy the producer recycles the oldest published
+    frame, so the consumer always catches up on the freshest captures.
+    """
+    
+    def __init__(self, shape: Tuple[int, ...], size: int):
+        self.frames = [np.empty(shape, dtype=np.uint8) for _ in range(size)]
+        # Set by the producer if it dies, so the consumer can re-raise it
+        self.capture_error: Optional[BaseException] = None
+        self._free: queue.Queue = queue.Queue()
+        self._filled: queue.Queue = queue.Queue()
+        for index in range(size):
+            self._free.put(index)
+    
+    def acquire_free(self) -> Optional[int]:
+        """Slot the producer should write the next frame into, if any."""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._filled.get_nowait()
+        except queue.Empty:
+            return None
+    
+    def publish(self, index: int):
+        """Hand a freshly written slot to the consumer."""
+        self._filled.put(index)
+    
+    def take_batch(self, max_size: int, timeout: float, fill_timeout: float) -> List[int]:
+        """
+        Wait up to `timeout` for a published slot, then up to `fill_timeout`
+        more for the batch to fill to `max_size`.
+        """
+        try:
+            batch = [self._filled.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.perf_counter() + fill_timeout
+        while len(batch) < max_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._filled.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def release(self, indices: List[int]):
+        """Return consumed slots to the producer."""
+        for index in indices:
+            self._free.put(index)
+
+
 class VisionEngine:
     """
     Handles screen capture and YOLOv8-based enemy jungler detection.
@@ -113,6 +212,13 @@ class VisionEngine:
         "BOT RIVER": (0.55, 0.55, 0.85, 0.85),
         "DRAGON PIT": (0.75, 0.75, 1.0, 1.0),
     }
+    
+    # LOCATION_ZONES as an (N, 4) array for vectorized containment tests
+    _ZONE_BOUNDS = np.array(list(LOCATION_ZONES.values()), dtype=np.float32)
+    _ZONE_NAMES = list(LOCATION_ZONES.keys())
+    
+    # Choice pools for mock detection, built once
+    _CHAMPION_VALUES = list(CLASS_NAMES.values())
 
     def __init__(
         self,
@@ -125,19 +231,36 @@ class VisionEngine:
         Initialize the Vision Engine.
         
         Args:
-            model_path: Path to trained YOLOv8 model (.pt file).
+            model_path: Path to trained YOLOv8 model (.pt file), or an ONNX
+                export (.onnx, see export_model.py) run with ONNX Runtime.
             minimap_region: Custom minimap region, or auto-detect if None.
             confidence_threshold: Minimum confidence for detections.
             use_mock: Force mock detection mode for testing.
         """
         self.minimap_region = minimap_region or MinimapRegion.auto_detect()
         self.confidence_threshold = confidence_threshold
-        self.screen_capture = mss.mss()
+        # Persistent BGR destination reused by every capture
+        self._frame_buffer = np.empty(
+            (self.minimap_region.height, self.minimap_region.width, 3), dtype=np.uint8
+        )
         self.use_mock = use_mock
         self.model = None
+        self.session = None
+        
+        # Frame differencing state: skip inference on unchanged minimaps
+        self._last_frame_hash: Optional[int] = None
+        self._last_detection: Optional[Detection] = None
         
-        # Load YOLO model if available and not in mock mode
-        if not use_mock and YOLO_AVAILABLE and model_path:
+        # Load ONNX / YOLO model if available and not in mock mode
+        if not use_mock and ORT_AVAILABLE and model_path and model_path.endswith(".onnx"):
+            try:
+                self._load_onnx(model_path)
+                print(f"[Vision] ONNX model loaded from {model_path} ({self.session.get_providers()[0]})")
+            except Exception as e:
+                print(f"[Vision] Failed to load model: {e}")
+                print("[Vision] Falling back to mock detection")
+                self.use_mock = True
+        elif not use_mock and YOLO_AVAILABLE and model_path:
             try:
                 self.model = YOLO(model_path)
                 print(f"[Vision] YOLO model loaded from {model_path}")
@@ -149,12 +272,38 @@ class VisionEngine:
             print("[Vision] No model path provided, using mock detection")
             self.use_mock = True
 
-    def capture_minimap(self) -> np.ndarray:
+    def _load_onnx(self, model_path: str):
+        """Create an ONNX Runtime session, preferring the GPU when available."""
+        available = ort.get_available_providers()
+        providers = [
+            provider for provider in ("CUDAExecutionProvider", "CPUExecutionProvider")
+            if provider in available
+        ]
+        self.session = ort.InferenceSession(model_path, providers=providers)
+        
+        model_input = self.session.get_inputs()[0]
+        self._onnx_input_name = model_input.name
+        self._onnx_input_size = onnx_input_size(self.session)
+        self._onnx_input_dtype = np.float16 if model_input.type == "tensor(float16)" else np.float32
+        # Static exports only accept batch size 1
+        self._onnx_batched = not isinstance(model_input.shape[0], int) or model_input.shape[0] > 1
+
+    def capture_minimap(
+        self,
+        out: Optional[np.ndarray] = None,
+        screen_capture: Optional["mss.base.MSSBase"] = None
+    ) -> np.ndarray:
         """
         Capture the minimap region of the screen.
         
+        Args:
+            out: Destination buffer, or the engine's persistent buffer if None.
+            screen_capture: mss instance owned by the calling thread. If None,
+                a temporary one is opened and closed for this single grab.
+        
         Returns:
-            BGR numpy array of the minimap.
+            BGR numpy array of the minimap. The array is reused by the next
+            capture; copy it if it must outlive that call.
         """
         monitor = {
             "left": self.minimap_region.left,
@@ -163,8 +312,19 @@ class VisionEngine:
             "height": self.minimap_region.height,
         }
         
-        screenshot = self.screen_capture.grab(monitor)
-        frame = np.array(screenshot)[:, :, :3]  # BGRA -> BGR
+        # mss handles are not safe to share across threads, so none is kept
+        if screen_capture is None:
+            with mss.mss() as temporary_capture:
+                screenshot = temporary_capture.grab(monitor)
+        else:
+            screenshot = screen_capture.grab(monitor)
+        
+        # Zero-copy BGRA view over the raw grab, then a single copy into BGR
+        bgra = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+            screenshot.height, screenshot.width, 4
+        )
+        frame = self._frame_buffer if out is None else out
+        np.copyto(frame, bgra[:, :, :3])
         
         return frame
 
@@ -180,14 +340,19 @@ class VisionEngine:
             Human-readable location string.
         """
         height, width = frame_shape[:2]
-        center_x = (bbox[0] + bbox[2]) / 2 / width
-        center_y = (bbox[1] + bbox[3]) / 2 / height
+        center_x = (bbox[0] + bbox[2]) * 0.5 / width
+        center_y = (bbox[1] + bbox[3]) * 0.5 / height
         
-        for zone_name, (x1, y1, x2, y2) in self.LOCATION_ZONES.items():
-            if x1 <= center_x <= x2 and y1 <= center_y <= y2:
-                return zone_name
+        zones = self._ZONE_BOUNDS
+        inside = (
+            (zones[:, 0] <= center_x) & (center_x <= zones[:, 2]) &
+            (zones[:, 1] <= center_y) & (center_y <= zones[:, 3])
+        )
+        if not inside.any():
+            return "JUNGLE"
         
-        return "JUNGLE"
+        # argmax returns the first match, preserving LOCATION_ZONES priority
+        return self._ZONE_NAMES[int(np.argmax(inside))]
 
     def detect(self, frame: np.ndarray) -> Optional[Detection]:
         """
@@ -199,24 +364,141 @@ class VisionEngine:
         Returns:
             Detection object if enemy jungler found, None otherwise.
         """
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames: List[np.ndarray]) -> List[Optional[Detection]]:
+        """
+        Run detection on several minimap frames in a single model call.
+        
+        Args:
+            frames: BGR numpy arrays of the minimap.
+            
+        Returns:
+            One Detection (or None) per frame, in input order.
+        """
         if self.use_mock:
-            return self._mock_detect()
+            return [self._mock_detect() for _ in frames]
+        
+        # Only run the model on frames that differ from the one before them;
+        # unchanged minimaps reuse the previous frame's detection
+        hashes = [self._frame_hash(frame) for frame in frames]
+        previous = [self._last_frame_hash] + hashes[:-1]
+        changed = [i for i, (h, prev) in enumerate(zip(hashes, previous)) if h != prev]
+        
+        inferred = {}
+        if changed:
+            inferred = dict(zip(changed, self._infer_batch([frames[i] for i in changed])))
+        
+        detections = []
+        detection = self._last_detection
+        for i in range(len(frames)):
+            if i in inferred:
+                detection = inferred[i]
+            detections.append(detection)
+        
+        self._last_frame_hash = hashes[-1]
+        self._last_detection = detection
+        return detections
+
+    @staticmethod
+    def _frame_hash(frame: np.ndarray) -> int:
+        """Fingerprint a frame from a cheap 1/8-scale green-channel sample."""
+        sample = frame[::8, ::8, 1].tobytes()
+        if XXHASH_AVAILABLE:
+            return xxhash.xxh64_intdigest(sample)
+        return hash(sample)
+
+    def _infer_batch(self, frames: List[np.ndarray]) -> List[Optional[Detection]]:
+        """Run the loaded model on a batch of frames."""
+        if self.session is not None:
+            return self._detect_batch_onnx(frames)
+        
+        # Run YOLO inference on the whole batch at once
+        results = self.model(frames, verbose=False)
+        
+        return [
+            self._best_detection(result, frame.shape)
+            for result, frame in zip(results, frames)
+        ]
+
+    def _detect_batch_onnx(self, frames: List[np.ndarray]) -> List[Optional[Detection]]:
+        """Run an exported YOLOv8 model through ONNX Runtime."""
+        size = self._onnx_input_size
+        inputs = np.stack([self._preprocess(frame, size) for frame in frames])
+        inputs = inputs.astype(self._onnx_input_dtype, copy=False)
         
-        # Run YOLO inference
-        results = self.model(frame, verbose=False)[0]
+        if self._onnx_batched:
+            outputs = self.session.run(None, {self._onnx_input_name: inputs})[0]
+        else:
+            outputs = np.concatenate([
+                self.session.run(None, {self._onnx_input_name: inputs[i:i + 1]})[0]
+                for i in range(len(frames))
+            ])
         
-        # Find highest confidence detection
+        return [
+            self._best_onnx_detection(prediction, frame.shape, size)
+            for prediction, frame in zip(outputs, frames)
+        ]
+
+    @staticmethod
+    def _preprocess(frame: np.ndarray, size: int) -> np.ndarray:
+        """Nearest-neighbour resize to the model input, BGR HWC uint8 -> RGB CHW float32."""
+        height, width = frame.shape[:2]
+        rows = np.arange(size) * height // size
+        cols = np.arange(size) * width // size
+        resized = frame[rows[:, None], cols, ::-1]
+        return resized.transpose(2, 0, 1).astype(np.float32) * (1.0 / 255.0)
+
+    def _best_onnx_detection(
+        self, prediction: np.ndarray, frame_shape: Tuple[int, ...], size: int
+    ) -> Optional[Detection]:
+        """
+        Pick the highest-confidence box from one raw YOLOv8 output.
+        
+        The output is (4 + num_classes, num_boxes) with boxes as cx, cy, w, h
+        in model input pixels. Only the best box is kept, so NMS is unnecessary.
+        """
+        scores = prediction[4:].astype(np.float32)
+        class_ids = scores.argmax(axis=0)
+        confidences = scores[class_ids, np.arange(scores.shape[1])]
+        best = int(confidences.argmax())
+        confidence = float(confidences[best])
+        if confidence < self.confidence_threshold:
+            return None
+        
+        height, width = frame_shape[:2]
+        scale_x, scale_y = width / size, height / size
+        cx, cy, box_w, box_h = prediction[:4, best].astype(np.float32)
+        bbox = (
+            int((cx - box_w / 2) * scale_x),
+            int((cy - box_h / 2) * scale_y),
+            int((cx + box_w / 2) * scale_x),
+            int((cy + box_h / 2) * scale_y),
+        )
+        class_id = int(class_ids[best])
+        
+        return Detection(
+            champion=self.CLASS_NAMES.get(class_id, f"Unknown({class_id})"),
+            confidence=confidence,
+            location=self._get_location_from_bbox(bbox, frame_shape),
+            bbox=bbox
+        )
+
+    def _best_detection(self, result, frame_shape: Tuple[int, ...]) -> Optional[Detection]:
+        """
+        Pick the highest-confidence box above threshold from one YOLO result.
+        """
         best_detection = None
         best_confidence = 0
         
-        for box in results.boxes:
+        for box in result.boxes:
             confidence = float(box.conf[0])
             
             if confidence >= self.confidence_threshold and confidence > best_confidence:
                 class_id = int(box.cls[0])
                 bbox = tuple(map(int, box.xyxy[0].tolist()))
                 champion = self.CLASS_NAMES.get(class_id, f"Unknown({class_id})")
-                location = self._get_location_from_bbox(bbox, frame.shape)
+                location = self._get_location_from_bbox(bbox, frame_shape)
                 
                 best_detection = Detection(
                     champion=champion,
@@ -232,10 +514,9 @@ class VisionEngine:
         """
         Mock detection for testing (10% chance per call).
         """
-        import random
         if random.random() < 0.02:  # 2% chance per frame = ~1 alert per 5 seconds at 10 FPS
-            champion = random.choice(list(self.CLASS_NAMES.values()))
-            location = random.choice(list(self.LOCATION_ZONES.keys()))
+            champion = random.choice(self._CHAMPION_VALUES)
+            location = random.choice(self._ZONE_NAMES)
             return Detection(
                 champion=champion,
                 confidence=round(random.uniform(0.75, 0.98), 2),
@@ -244,34 +525,81 @@ class VisionEngine:
             )
         return None
 
-    def run_loop(self, fps: int = 10):
+    def _capture_loop(self, pool: FramePool, fps: int, stop: threading.Event):
+        """
+        Producer thread: capture frames into free pool slots at the target FPS.
+        """
+        frame_time = 1.0 / fps
+        
+        try:
+            # The mss handle is created, used and closed on this thread only
+            with mss.mss() as screen_capture:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    
+                    index = pool.acquire_free()
+                    if index is not None:
+                        self.capture_minimap(out=pool.frames[index], screen_capture=screen_capture)
+                        pool.publish(index)
+                    
+                    # Maintain target FPS
+                    elapsed = time.perf_counter() - start
+                    stop.wait(max(0, frame_time - elapsed))
+        except Exception as e:
+            print(f"[Vision] Capture thread failed: {e}")
+            pool.capture_error = e
+
+    async def run_loop(self, fps: int = 10, batch_size: int = 4, batch_timeout: float = 0.01):
         """
-        Generator that yields detections at the specified FPS.
+        Async generator that yields detections at the specified FPS.
+        
+        Capture runs in its own thread and hands frames over through a
+        FramePool. Frames that pile up while inference is busy are detected
+        together in one batched model call. Waiting for frames and running
+        inference are offloaded with asyncio.to_thread so the event loop
+        stays free.
         
         Args:
             fps: Target frames per second.
+            batch_size: Maximum frames per model call.
+            batch_timeout: Extra wait (seconds) for a batch to fill.
             
         Yields:
             Detection objects when enemy jungler is spotted.
         """
-        frame_time = 1.0 / fps
+        region = self.minimap_region
+        pool = FramePool((region.height, region.width, 3), size=batch_size * 2)
+        stop = threading.Event()
+        capture_thread = threading.Thread(
+            target=self._capture_loop, args=(pool, fps, stop), daemon=True
+        )
         
         print(f"[Vision] Starting detection loop at {fps} FPS")
         print(f"[Vision] Mode: {'MOCK' if self.use_mock else 'YOLO'}")
         
-        while True:
-            start = time.perf_counter()
-            
-            frame = self.capture_minimap()
-            detection = self.detect(frame)
-            
-            if detection:
-                yield detection
-            
-            # Maintain target FPS
-            elapsed = time.perf_counter() - start
-            sleep_time = max(0, frame_time - elapsed)
-            time.sleep(sleep_time)
+        capture_thread.start()
+        try:
+            while True:
+                batch = await asyncio.to_thread(pool.take_batch, batch_size, 1.0, batch_timeout)
+                if not batch:
+                    if not capture_thread.is_alive():
+                        if pool.capture_error is not None:
+                            raise pool.capture_error
+                        raise RuntimeError("Capture thread stopped unexpectedly")
+                    continue
+                try:
+                    detections = await asyncio.to_thread(
+                        self.detect_batch, [pool.frames[index] for index in batch]
+                    )
+                finally:
+                    pool.release(batch)
+                
+                for detection in detections:
+                    if detection:
+                        yield detection
+        finally:
+            stop.set()
+            capture_thread.join(timeout=1.0)
 
 
 # Test the vision engine
@@ -284,8 +612,11 @@ if __name__ == "__main__":
     
     print("\n[Test] Running detection loop (Ctrl+C to stop)...")
     
-    try:
-        for detection in engine.run_loop(fps=10):
+    async def _print_detections():
+        async for detection in engine.run_loop(fps=10):
             print(f"[DETECTED] {detection.champion} at {detection.location} ({detection.confidence:.0%})")
+    
+    try:
+        asyncio.run(_print_detections())
     except KeyboardInterrupt:
         print("\n[Test] Stopped.")
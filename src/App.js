@@ -37,18 +37,22 @@ function App() {
 
     ws.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data)
-
-        if (data.type === "alert") {
-          setAlert({
-            champion: data.champion,
-            location: data.location,
-            confidence: data.confidence,
-          })
-
-          setIsFlashing(true)
-          setTimeout(() => setIsFlashing(false), 600)
-          setTimeout(() => setAlert(null), ALERT_DURATION)
+        // The backend coalesces packets into a JSON array per frame
+        const parsed = JSON.parse(event.data)
+        const packets = Array.isArray(parsed) ? parsed : [parsed]
+
+        for (const data of packets) {
+          if (data.type === "alert") {
+            setAlert({
+              champion: data.champion,
+              location: data.location,
+              confidence: data.confidence,
+            })
+
+            setIsFlashing(true)
+            setTimeout(() => setIsFlashing(false), 600)
+            setTimeout(() => setAlert(null), ALERT_DURATION)
+          }
         }
       } catch (e) {
         console.error("[WS] Parse error:", e)